@@ -2,7 +2,16 @@ from finstats.src.core import *
 import datetime as dt
 import calendar
 
+_MONTH_NAMES = tuple(calendar.month_name)[1:]
+
+def _fast_round(df:pd.DataFrame,decimals:int) -> pd.DataFrame:
+    '''
+    Round a float DataFrame with a single np.round over its values.
+    '''
+    return pd.DataFrame(np.round(df.to_numpy(),decimals),index=df.index,columns=df.columns)
+
 class sbs:
+    @log_errors('ERROR initializing strategy stats')
     def __init__(self,balance:pd.Series,bm_balance:pd.Series,start_date:dt.date,end_date:dt.date) -> None:
         '''
         Initialize an instance of the single balance stats (sbs) class.
@@ -16,24 +25,24 @@ class sbs:
         bm_balance (pd.Series): A pandas Series object representing the benchmark balance data for comparison.
         '''
 
-        try:
-            raw_data = [bm_balance,balance]
+        # fin_stats by stats frequency, so repeated calls reuse the computed returns:
+        self._stats_by_freq = {}
 
-            formatted_data = {}
-            for data in raw_data:
-                name = data.name
+        raw_data = [bm_balance,balance]
 
-                # Adjust date:
-                check_data_index(data)
-                data = data.loc[start_date:end_date]
-                formatted_data[name] = data
-            
-            self.balance = formatted_data[balance.name]
-            self.bm_balance = formatted_data[bm_balance.name]
+        formatted_data = {}
+        for data in raw_data:
+            name = data.name
+
+            # Adjust date:
+            check_data_index(data)
+            data = data.loc[start_date:end_date]
+            formatted_data[name] = data
         
-        except Exception as e:
-            logging.exception(f'ERROR initializing strategy stats | {e}')
+        self.balance = formatted_data[balance.name]
+        self.bm_balance = formatted_data[bm_balance.name]
 
+    @log_errors('ERROR Retriving balance stats')
     def get_stats(self,freq=str,annual_rf = 0.022) -> dict:
         '''
         Calculate and return various financial statistics based on the initialized balance data.
@@ -50,109 +59,218 @@ class sbs:
         Note:
         The method assumes that the class has been properly initialized with the necessary balance data and benchmark balance data.
         '''
-        try:
-            # Standarize Rf:
-            rf = get_rf(rf=annual_rf,stats_freq=freq)
+        # Standarize Rf:
+        rf = get_rf(rf=annual_rf,stats_freq=freq)
+        return self._compute_stats(freq=freq,rf=rf)
 
-            # Initialize stats object:
+    def _fin_stats(self,freq:str) -> fin_stats:
+        '''
+        fin_stats object for freq, rebuilt only if balance or bm_balance were reassigned.
+        '''
+        stats = self._stats_by_freq.get(freq)
+        if (stats is None or getattr(stats,'balance',None) is not self.balance
+                or getattr(stats,'bm_balance',None) is not self.bm_balance):
             stats = fin_stats(balance = self.balance,
                               bm_balance = self.bm_balance,
                               stats_freq = freq)
+            self._stats_by_freq[freq] = stats
+        return stats
 
-            # Basic Stats:
-            mean = stats.mean_returns()
-            std = stats.returns_standard_deviation()
-
-            # Misc:
-            excess_return = mean - rf
-            downside_dev = stats.downside_deviation()
-            pos = stats.positive_returns_pct()
-            neg = 1 - pos
-            linreg = stats.beta_alpha()
-            
-            # Risk-adjusted performance ratios:
-            sharpe = excess_return/std
-            sortino = excess_return/downside_dev
-            
-            # Investment Risk Measures:
-            var_99 = mean - std * 2.56
-            es_99 = stats.es()
-            max_loss = stats.min_return()
-            max = stats.max_return()
-            losing_streak = stats.losing_streak()
-            max_dd = stats.max_dd()
-            recovery = stats.recovery()
-            corr = stats.correlation()
-
-            calmar_ratio = excess_return/abs(max_loss)
-
-            info = {
-                'Stats Since': str(self.balance.index[0].date()),
-                'Geometric Mean Return': mean,
-                'Standard Deviation': std,
-                'Downside Standard Deviation':downside_dev,
-                'Sharpe Ratio':sharpe,
-                'Sortino Ratio':sortino,
-                'Calmar Ratio':calmar_ratio,
-                'Max DD':max_dd,
-                'Max Return': max,
-                'Min Return': max_loss,
-                'VAR 99':var_99,
-                'ES 99': es_99,
-                'Positive %':pos,
-                'Negative %':neg,
-                'Max Losing Streak': losing_streak,
-                'Recovery Max DD': recovery,
-                'Correlation': corr
-                }
-                
-            # Stats only relevant to strategy:
-            info['Information Ratio'] = stats.info_ratio()
-            info['Beta'] = linreg['beta']
-            info['Alpha'] = linreg['alpha']
-            info['Jensen Alpha'] = stats.jensen_alpha(rf=rf)
+    def _compute_stats(self,freq:str,rf:float) -> dict:
+        '''
+        Stats computation behind get_stats, rf is the risk-free rate already standarized to freq.
+        '''
+        stats = self._fin_stats(freq=freq)
+
+        # Basic Stats:
+        mean = stats.mean_returns()
+        std = stats.returns_standard_deviation()
+
+        # Misc:
+        excess_return = mean - rf
+        downside_dev = stats.downside_deviation()
+        pos = stats.positive_returns_pct()
+        neg = 1 - pos
+        linreg = stats.beta_alpha()
+        
+        # Risk-adjusted performance ratios:
+        sharpe = np.divide(excess_return,std)
+        sortino = np.divide(excess_return,downside_dev)
+        
+        # Investment Risk Measures:
+        var_99, es_99 = stats.var_es()
+        max_loss = stats.min_return()
+        max = stats.max_return()
+        losing_streak = stats.losing_streak()
+        max_dd = stats.max_dd()
+        recovery = stats.recovery()
+        corr = stats.correlation()
+
+        calmar_ratio = excess_return/abs(max_loss) if max_loss != 0 else np.nan
+
+        info = {
+            'Stats Since': str(self.balance.index[0].date()),
+            'Geometric Mean Return': mean,
+            'Standard Deviation': std,
+            'Downside Standard Deviation':downside_dev,
+            'Sharpe Ratio':sharpe,
+            'Sortino Ratio':sortino,
+            'Calmar Ratio':calmar_ratio,
+            'Max DD':max_dd,
+            'Max Return': max,
+            'Min Return': max_loss,
+            'VAR 99':var_99,
+            'ES 99': es_99,
+            'Positive %':pos,
+            'Negative %':neg,
+            'Max Losing Streak': losing_streak,
+            'Recovery Max DD': recovery,
+            'Correlation': corr
+            }
             
-            return info
+        # Stats only relevant to strategy:
+        info['Information Ratio'] = stats.info_ratio()
+        info['Beta'] = linreg['beta']
+        info['Alpha'] = linreg['alpha']
+        info['Jensen Alpha'] = stats.jensen_alpha(rf=rf)
         
-        except Exception as e:
-            logging.exception(f'ERROR Retriving balance stats | {e}')    
+        return info
         
+    @log_errors('ERROR Retriving Stats df')
     def df(self,freq=str):
         '''
         return data series with strategy stats
         '''
-        try:
-            strat_stats = self.get_stats(freq=freq)
-            return pd.Series(strat_stats).rename(f'{freq} Stats')
-        except Exception as e:
-            logging.exception(f'ERROR Retriving Stats df | {e}')
+        strat_stats = self.get_stats(freq=freq)
+        return pd.Series(strat_stats).rename(f'{freq} Stats')
 
+    @log_errors('ERROR Retriving Returns by month')
     def returns_by_month(self):
         '''
         Returns monthly returns by year and month
         '''
-        try:
-            monthly_balance = self.balance.groupby(pd.Grouper(freq='M')).last()
-            df = monthly_balance.pct_change(fill_method=None).to_frame()
-            df.index = pd.to_datetime(df.index)
-
-            # set year and month columns
-            df['Year'] = df.index.year
-            df['month'] = df.index.month
-
-            # create a pivot table to get the month-on-month price change
-            pivot = pd.pivot_table(df,index='Year', columns='month', aggfunc='first')
-            pivot.columns = list(calendar.month_name)[1:]
+        # Group by populated months, then reindex to every month so a gap leaves the next month NaN:
+        periods = self.balance.index.to_period('M')
+        monthly_balance = self.balance.groupby(periods).last()
+        monthly_balance = monthly_balance.reindex(pd.period_range(periods.min(),periods.max(),freq='M'))
+        monthly_returns = monthly_balance.pct_change(fill_method=None)
+
+        # Scatter into a (years, 12) array, one value per cell:
+        years = monthly_returns.index.year.to_numpy()
+        months = monthly_returns.index.month.to_numpy()
+        first_year = years.min()
+        table = np.full((years.max()-first_year+1,12),np.nan)
+        table[years-first_year,months-1] = monthly_returns.to_numpy(dtype=np.float64)
+
+        pivot = pd.DataFrame(table,
+                             index=pd.Index(np.arange(first_year,years.max()+1),name='Year'),
+                             columns=_MONTH_NAMES).dropna(how='all')
+
+        # Add Yearly returns:
+        pivot['Yearly Returns'] = pivot.add(1).prod(axis=1)-1
+
+        # Add Monthly AVG (geometric mean):
+        growth = pivot.add(1)
+        pivot.loc['Annualized Returns'] = growth.prod(min_count=1).pow(1/growth.count())-1
+        return _fast_round(pivot,6)
+
+def _batch_stats(balances:pd.DataFrame,bm_balance:pd.Series,freq:str,annual_rf=0.022) -> pd.DataFrame:
+    '''
+    Compute the sbs stats for every column of a balance DataFrame in a single vectorized pass.
 
-            # Add Yearly returns:
-            pivot['Yearly Returns'] = np.exp(np.log(1+pivot).sum(axis=1))-1
+    Parameters:
+    balances (pd.DataFrame): Balance data, one column per asset. Must share the benchmark frequency.
+    bm_balance (pd.Series): Benchmark balance data.
+    freq (str): The frequency at which the statistics should be calculated.
+    annual_rf (float, optional): Annual risk-free rate. Default value is 0.022 (or 2.2%).
 
-            # Add Monthly AVG:
-            pivot.loc['Annualized Returns'] = np.exp(np.log(1+pivot).mean())-1
-            return round(pivot,6)
-        
-        except Exception as e:
-            logging.exception(f'ERROR Retriving Returns by month | {e}')
+    Returns:
+    pd.DataFrame: Stats by metric (rows) and asset (columns), same layout as sbs.df.
+    '''
+    rf = get_rf(rf=annual_rf,stats_freq=freq)
+    stats_freq = get_stats_freq(balance=balances,bm_balance=bm_balance,freq=freq)
+
+    # Column-major so each asset is contiguous for the reductions and kernels:
+    balance_values = np.asfortranarray(balances.to_numpy(dtype=np.float64))
+    check_balance_values(balance_values)
+    returns_values = period_returns(balance_values,stats_freq)
+    returns = pd.DataFrame(returns_values,index=balances.index,columns=balances.columns)
+    log_returns = np.log1p(returns)
+    bm_returns = pd.Series(period_returns(bm_balance.to_numpy(dtype=np.float64),stats_freq),index=bm_balance.index)
+    bm_log_returns = np.log1p(bm_returns)
+
+    # Benchmark aligned to the asset dates (pairwise NaNs are dropped downstream):
+    aligned_bm_returns = bm_returns.reindex(returns.index).to_numpy()
+    aligned_bm_log_returns = bm_log_returns.reindex(returns.index).to_numpy()
+
+    # Basic Stats:
+    log_mean = log_returns.mean()
+    mean = np.expm1(log_mean)
+    std = np.expm1(log_returns.std())
+
+    # Misc:
+    excess_return = mean - rf
+    downside_dev = np.expm1(batch_masked_std(log_returns.to_numpy(),log_returns.lt(log_mean).to_numpy()))
+    with np.errstate(invalid='ignore'):
+        pos = np.count_nonzero(returns_values>=0,axis=0)/np.count_nonzero(~np.isnan(returns_values),axis=0)
+    neg = 1 - pos
+    beta, intercept, _ = batch_regression(aligned_bm_log_returns,log_returns.to_numpy())
+    _, _, corr = batch_regression(aligned_bm_returns,returns.to_numpy())
+
+    # Risk-adjusted performance ratios:
+    sharpe = excess_return/std
+    sortino = excess_return/downside_dev
+
+    # Investment Risk Measures:
+    var_99, es_99 = batch_tail_risk(returns_values)
+    max_loss = returns.min()
+    max = returns.max()
+    losing_streak = batch_losing_streak(returns_values)
+    drawdown = batch_drawdown(balance_values)
+    max_dd = batch_max_drawdown(balance_values,drawdown)
+    recovery = [None if np.isnan(x) else int(x) for x in batch_recovery(balance_values,drawdown)]
+
+    calmar_ratio = (excess_return/abs(max_loss)).where(max_loss != 0)
+
+    # Stats only relevant to strategy:
+    outperf_bm = log_returns.sub(bm_log_returns,axis=0)
+    outperf_mean = np.expm1(outperf_bm.mean())
+    outperf_std = np.expm1(outperf_bm.std())
+    info_ratio = (outperf_mean/outperf_std).where(outperf_std > 0)
+
+    bm_mean = np.expm1(bm_log_returns.mean())
+    jensen_alpha = mean - (rf + beta*(bm_mean - rf))
+
+    info = {
+        'Stats Since': str(balances.index[0].date()),
+        'Geometric Mean Return': mean,
+        'Standard Deviation': std,
+        'Downside Standard Deviation':downside_dev,
+        'Sharpe Ratio':sharpe,
+        'Sortino Ratio':sortino,
+        'Calmar Ratio':calmar_ratio,
+        'Max DD':max_dd,
+        'Max Return': max,
+        'Min Return': max_loss,
+        'VAR 99':var_99,
+        'ES 99': es_99,
+        'Positive %':pos,
+        'Negative %':neg,
+        'Max Losing Streak': pd.Series(losing_streak,index=balances.columns,dtype=object),
+        'Recovery Max DD': pd.Series(recovery,index=balances.columns,dtype=object),
+        'Correlation': corr,
+        'Information Ratio': info_ratio,
+        'Beta': beta,
+        'Alpha': np.expm1(intercept),
+        'Jensen Alpha': jensen_alpha,
+        }
+    
+    # Fill the metric x asset table in place and wrap it once:
+    stats = np.empty((len(info),len(balances.columns)),dtype=object)
+    for row, values in enumerate(info.values()):
+        stats[row] = values
+    
+    return pd.DataFrame(stats,index=list(info),columns=balances.columns)
 
 class mbs:
     def __init__(self,asset_price_data=pd.DataFrame,bm_data = pd.Series,start_date=dt.date,end_date=dt.date) -> None:
@@ -174,10 +292,18 @@ class mbs:
         The asset price data and the benchmark data should be aligned in terms of dates, with each row corresponding to the same date across all data series.
         '''
         raw_apd = asset_price_data.loc[start_date:end_date]
-        self.apd = format_raw_data(raw_data=raw_apd)
+        apd = format_raw_data(raw_data=raw_apd)
+
+        # Single contiguous float64 block, column-major so each asset is contiguous:
+        apd_values = np.asfortranarray(apd.to_numpy(dtype=np.float64))
+        self.apd = pd.DataFrame(apd_values,index=apd.index,columns=apd.columns)
         self.start_date = start_date
         self.end_date = end_date
         self.bm_df = bm_data
+
+        # Validate and slice the benchmark once for every stats call:
+        check_data_index(self.bm_df)
+        self.bm_balance = self.bm_df.loc[start_date:end_date]
     
     def stats_df(self,freq):
         '''
@@ -194,16 +320,7 @@ class mbs:
         Note:
         This method assumes that the mbs class has been properly initialized with the necessary asset price data and benchmark data.
         '''
-        stats = []
-        for asset in self.apd.columns:
-            balance = self.apd[asset]
-            stats_series = sbs(balance=balance,
-                        start_date=self.start_date,
-                        end_date=self.end_date,
-                        bm_balance=self.bm_df).df(freq=freq)
-            stats.append(stats_series.rename(asset))
-        
-        return pd.concat(stats,axis=1)
+        return _batch_stats(balances=self.apd,bm_balance=self.bm_balance,freq=freq)
     
     def indexed_returns(self,freq='B'):
         '''
@@ -221,32 +338,30 @@ class mbs:
         The method uses the asset price data (`apd`) that should already be present in the class instance. It assumes that the `apd` data is a pandas DataFrame with dates as the index and asset prices in the columns.
         '''
     
-        pct_df = self.apd.resample(freq).last().pct_change(fill_method=None)
-        
-        prices_indexed = 100*np.exp(np.log(1+pct_df).cumsum())
+        resampled = self.apd.resample(freq).last()
+        prices = resampled.to_numpy(dtype=np.float64)
+
+        # Indexed prices are the ratio to the first price, no need to compound returns:
+        prices_indexed = np.round(100*prices/prices[0],3)
         
-        # Add initial index:
-        prices_indexed.loc[self.start_date] = 100
-        prices_indexed.index = pd.to_datetime(prices_indexed.index)
-        return round(prices_indexed.sort_index(),3).dropna()
+        # Label initial index with the start date:
+        index = resampled.index[1:].insert(0,pd.Timestamp(self.start_date))
+        return pd.DataFrame(prices_indexed,index=index,columns=resampled.columns).dropna()
     
 def asset_perf_contribution(start_date, end_date, asset_price_data=pd.DataFrame, portfolio=pd.Series):
     '''
     Performance contribution by asset
     '''
-    # Calculate percentage change
-    pct_change = asset_price_data.loc[start_date:end_date].pct_change(fill_method=None)
-    
-    # Calculate log returns
-    log_returns = np.log(1 + pct_change)
-    
-    # Calculate cumulative returns
-    cumulative_returns = np.exp(log_returns.cumsum()) - 1
+    # Cumulative return is the ratio between the last and first valid price of the portfolio assets
+    # (assets listed after start_date compound from their first price):
+    prices = asset_price_data.loc[start_date:end_date,portfolio.index]
+    first = prices.bfill().iloc[0].to_numpy(dtype=np.float64)
+    last = prices.iloc[-1].to_numpy(dtype=np.float64)
     
     # Calculate asset contribution
-    asset_contribution = cumulative_returns.iloc[-1].loc[portfolio.index] * portfolio
+    asset_contribution = (last/first - 1) * portfolio.to_numpy(dtype=np.float64)
     
-    return asset_contribution
+    return pd.Series(asset_contribution,index=portfolio.index)
 
 def seasonality(price_data:pd.Series):
     """
@@ -266,13 +381,18 @@ def seasonality(price_data:pd.Series):
         raise ValueError("price_data must be a pandas Series")
 
     # Calculate monthly percentage change
-    df_pct = np.log(1 + price_data.resample('M').last().pct_change())
+    df_pct = np.log1p(price_data.resample('M').last().pct_change())
+
+    # Group by month and calculate descriptive statistics (describe layout, cython aggregations)
+    grouped = df_pct.groupby(df_pct.index.month)
+    quartiles = grouped.quantile([0.25,0.5,0.75]).unstack()
+    quartiles.columns = ['25%','50%','75%']
+    log_stats = pd.concat([grouped.agg(['mean','std','min']),quartiles,grouped.max().rename('max')],axis=1)
 
-    # Group by month and calculate descriptive statistics
-    monthly_stats = np.exp(df_pct.groupby(df_pct.index.month).describe()) - 1
+    monthly_stats = np.expm1(log_stats)
+    monthly_stats.insert(0,'count',grouped.count().astype(np.float64))
 
     # Replace numerical index with month names
-    month_names = [calendar.month_name[i] for i in monthly_stats.index]
-    monthly_stats.index = month_names
+    monthly_stats.index = [_MONTH_NAMES[m-1] for m in monthly_stats.index]
 
     return monthly_stats
\ No newline at end of file
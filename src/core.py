@@ -1,10 +1,13 @@
 from finstats.src.utils import *
+from finstats.src.kernels import *
 import numpy as np
-import logging
+import math
+import functools
 
 class fin_stats:
 
-    def __init__(self,balance:pd.Series,stats_freq:str,bm_balance:pd.Series=None) -> None:
+    @log_errors('Failed to Initialize fin_stats')
+    def __init__(self,balance:pd.Series,stats_freq:str,bm_balance:pd.Series=None,dtype=np.float64) -> None:
         """
         Initialize the FinStats object with financial data and calculate relevant statistics.
 
@@ -12,105 +15,151 @@ class fin_stats:
         balance (pd.Series): A Pandas Series representing the balance of an investment over time.
         stats_freq (str): Frequency string to define the periodicity for calculating returns.
         bm_balance (pd.Series, optional): A Pandas Series representing the benchmark balance over time. Defaults to None.
+        dtype (np.dtype, optional): Floating point type of the arrays behind every statistic. np.float32 halves the memory
+                                    traffic on very long series at the cost of precision. Defaults to np.float64.
 
         The constructor tries to calculate various statistics such as returns and logarithmic returns for both 
         the balance and the benchmark balance (if provided). If any error occurs during these calculations, 
         it logs the exception with a descriptive message.
         """
-        try:
-            stats_freq = get_stats_freq(balance=balance,
-                                        bm_balance=bm_balance,
-                                        freq=stats_freq)
-            
-            self.balance = balance
-            self.returns = balance.pct_change(stats_freq, fill_method=None)
-            self.log_returns = np.log(1 + self.returns)
-            
-            if bm_balance is not None:
-                self.bm_balance = bm_balance
-                self.bm_returns = bm_balance.pct_change(stats_freq, fill_method=None)
-                self.bm_log_returns = np.log(1 + self.bm_returns)
+        stats_freq = get_stats_freq(balance=balance,
+                                    bm_balance=bm_balance,
+                                    freq=stats_freq)
         
-        except Exception as e:
-            logging.exception(f'Failed to Initialize fin_stats | {e}')
+        self.balance = balance
+        self._balance = np.ascontiguousarray(balance.to_numpy(dtype=dtype))
+        check_balance_values(self._balance)
+        self.returns = pd.Series(period_returns(self._balance,stats_freq),index=balance.index,name=balance.name)
+        self.log_returns = np.log1p(self.returns)
+
+        # Valid observations as arrays of the given dtype, shared by every single series metric:
+        self._returns = self.returns.dropna().to_numpy(dtype=dtype)
+        self._log_returns = self.log_returns.dropna().to_numpy(dtype=dtype)
+        self._n_valid = self._returns.size
         
-    def mean_returns(self,geometric = True):
-        try:
-            if geometric:
-                mean = np.exp(self.log_returns.mean()) - 1
-            else:
-                mean = self.returns.mean()
-            return mean
+        self.bm_balance = bm_balance
+        if bm_balance is not None:
+            self.bm_returns = pd.Series(period_returns(np.ascontiguousarray(bm_balance.to_numpy(dtype=dtype)),stats_freq),
+                                        index=bm_balance.index,name=bm_balance.name)
+            self.bm_log_returns = np.log1p(self.bm_returns)
+            self._bm_returns = self.bm_returns.dropna().to_numpy(dtype=dtype)
+            self._bm_log_returns = self.bm_log_returns.dropna().to_numpy(dtype=dtype)
+
+            # Align with the benchmark once, keeping pairwise complete observations:
+            common_index = self.returns.index.intersection(self.bm_returns.index)
+            returns = self.returns.reindex(common_index).to_numpy(dtype=dtype)
+            bm_returns = self.bm_returns.reindex(common_index).to_numpy(dtype=dtype)
+            paired = ~np.isnan(returns) & ~np.isnan(bm_returns)
+
+            self._paired_returns = returns[paired]
+            self._paired_bm_returns = bm_returns[paired]
+            self._paired_log_returns = np.log1p(self._paired_returns)
+            self._paired_bm_log_returns = np.log1p(self._paired_bm_returns)
+
+    @functools.cached_property
+    def _log_mean(self) -> float:
+        if self._n_valid == 0:
+            return np.nan
+        return self._log_returns.mean()
+
+    # Log returns minus their mean, shared by the standard and downside deviations:
+    @functools.cached_property
+    def _log_deviations(self) -> np.ndarray:
+        return self._log_returns - self._log_mean
+
+    # Running peak and drawdown, shared by max_dd and recovery:
+    @functools.cached_property
+    def _drawdown(self) -> tuple:
+        return batch_drawdown(self._balance[:,None])
+
+    # Regressions against the benchmark, computed once and shared by beta_alpha, jensen_alpha and correlation:
+    @functools.cached_property
+    def _log_linreg(self):
+        return regression(self._paired_bm_log_returns,self._paired_log_returns)
+
+    @functools.cached_property
+    def _linreg(self):
+        return regression(self._paired_bm_returns,self._paired_returns)
         
-        except Exception as e:
-            logging.exception(f'ERROR calculating mean returns | {e}')
+    def _check_benchmark(self):
+        # Benchmark relative stats need the paired returns built in __init__:
+        if self.bm_balance is None:
+            raise ValueError('Benchmark stats need fin_stats to be initialized with a bm_balance')
+
+    @cached_method
+    def mean_returns(self,geometric = True):
+        if self._n_valid == 0:
+            return np.nan
+        if geometric:
+            return math.expm1(self._log_mean)
+        return self._returns.mean()
 
     def correlation(self):
-        try:
-            corr = self.returns.corr(self.bm_returns)
-            return corr
-        
-        except Exception as e:
-            logging.exception(f'ERROR calculating correlation | {e}')
+        self._check_benchmark()
+        return self._linreg[2]
 
+    @log_errors('ERROR calculating returns standard deviation')
+    @cached_method
     def returns_standard_deviation(self,geometric = True):
-        try:
-            if geometric:
-                std = np.exp(np.log(1+self.log_returns).std()) - 1
-            else:
-                std = self.returns.std()
-            return std
-        
-        except Exception as e:
-            logging.exception(f'ERROR calculating returns standard deviation | {e}')
+        if self._log_returns.size < 2:
+            return np.nan
+        if geometric:
+            deviations = self._log_deviations
+            std = math.expm1(math.sqrt(deviations@deviations/(deviations.size-1)))
+        else:
+            std = self._returns.std(ddof=1)
+        return std
 
+    @log_errors('ERROR calculating Downside standard deviation')
+    @cached_method
     def downside_deviation(self, geometric = True):
-        try:
-            if geometric:
-                mean = self.log_returns.mean()
-                dowside_dev = np.exp(self.log_returns[self.log_returns<mean].std())-1
-            else:
-                mean = self.mean_returns(geometric=False)
-                dowside_dev = self.returns[self.returns<mean].std()
-            
-            return dowside_dev
+        if geometric:
+            deviations = self._log_deviations
+            dowside_dev = math.expm1(masked_std(deviations,deviations<0))
+        else:
+            mean = self.mean_returns(geometric=False)
+            dowside_dev = masked_std(self._returns,self._returns<mean)
         
-        except Exception as e:
-            logging.exception(f'ERROR calculating Downside standard deviation | {e}')
+        return dowside_dev
 
+    @cached_method
     def positive_returns_pct(self):
-        try:
-            pos = self.returns[self.returns>=0].count()/self.returns.count()
-            return pos
-        
-        except Exception as e:
-            logging.exception(f'ERROR calculating Positive % returns | {e}')
+        if self._n_valid == 0:
+            return np.nan
+        return np.count_nonzero(self._returns>=0)/self._n_valid
+
+    @cached_method
+    def var_es(self,level = 99) -> tuple:
+        """
+        Value at Risk and Expected Shortfall from a single partition of the returns.
+
+        Returns:
+        tuple: (var, es) at the given confidence level in percent.
+        """
+        if self._n_valid == 0:
+            return np.nan, np.nan
+        return tail_risk(self._returns,level)
+
+    def var(self,level = 99):
+        return self.var_es(level)[0]
 
     def es(self,level = 99):
-        try:
-            percentail = 1 - level/100
-            es_99 = self.returns.quantile(percentail)
-            return es_99
-        
-        except Exception as e:
-            logging.exception(f'ERROR calculating ES99 | {e}')
+        return self.var_es(level)[1]
 
+    @cached_method
     def max_return(self):
-        try:
-            max = self.returns.max()
-            return max
-        
-        except Exception as e:
-            logging.exception(f'ERROR calculating Max Return | {e}')
+        if self._n_valid == 0:
+            return np.nan
+        return self._returns.max()
 
+    @cached_method
     def min_return(self):
-        try:
-            min = self.returns.min()
-            return min
-        
-        except Exception as e:
-            logging.exception(f'ERROR calculating Min Return  | {e}')
+        if self._n_valid == 0:
+            return np.nan
+        return self._returns.min()
 
+    @log_errors('ERROR calculating Max DD')
+    @cached_method
     def max_dd(self) -> float:
         """
         Calculates the maximum drawdown of a given balance series.
@@ -121,35 +170,28 @@ class fin_stats:
         Returns:
         float: The maximum drawdown as a percentage.
         """
-        try:
-            # Calculate Maximum Drawdown
-            running_max = self.balance.cummax()
-            drawdown = (self.balance - running_max) / running_max
-            max_drawdown = drawdown.min()
+        return max_drawdown(self._balance,self._drawdown)
 
-            return max_drawdown
+    @log_errors('ERROR calculating Rolling Max DD')
+    def rolling_max_dd(self,window:int) -> pd.Series:
+        """
+        Calculates the maximum drawdown over a rolling window of balance observations.
 
-        except Exception as e:
-            logging.exception(f'ERROR calculating Max DD | {e}')
+        Parameters:
+        window (int): Number of balance observations in each window.
 
+        Returns:
+        pd.Series: The maximum drawdown as a percentage of the window ending at each date.
+        """
+        return pd.Series(rolling_max_drawdown(self._balance,window),index=self.balance.index[window-1:],name=self.balance.name)
+
+    @log_errors('ERROR calculating losing streak')
+    @cached_method
     def losing_streak(self) -> int:
-        balance_pct = self.returns
-        try:
-            # Calculate Maximum Losing Streak
-            current_streak = 0
-            max_losing_streak = 0
-
-            for x in balance_pct:
-                if x < 0:
-                    current_streak += 1
-                    max_losing_streak = max(max_losing_streak, current_streak)
-                else:
-                    current_streak = 0
-            
-            return max_losing_streak
-        except Exception as e:
-            logging.exception(f'ERROR calculating losing streak | {e}')
+        return max_losing_streak(self.returns.to_numpy(dtype=np.float64))
 
+    @log_errors('ERROR calculating Recovery Max DD')
+    @cached_method
     def recovery(self) -> int:
         """
         Calculate the recovery period from the maximum drawdown in a given array.
@@ -158,85 +200,61 @@ class fin_stats:
         - recovery_period: Number of steps to recover from the maximum drawdown. 
                            Returns None if it never recovers.
         """
-        try:
-            peak = self.balance.iloc[0]
-            max_drawdown = 0
-            drawdown_start_index = 0
-
-            # Identify the maximum drawdown
-            for index, x in enumerate(self.balance):
-                if x > peak:
-                    peak = x
-                current_drawdown = (peak - x) / peak
-                if current_drawdown > max_drawdown:
-                    max_drawdown = current_drawdown
-                    drawdown_start_index = index
-
-            # Calculate the recovery period
-            if max_drawdown == 0:
-                return None  # No drawdown occurred
-
-            for recovery_index, x in enumerate(self.balance[drawdown_start_index:], start=drawdown_start_index):
-                if x >= peak:
-                    return recovery_index - drawdown_start_index
-
-            return None  # Never recovers
-        except Exception as e:
-            logging.exception(f'ERROR calculating Recovery Max DD | {e}')
+        return max_dd_recovery(self._balance,self._drawdown)
 
+    @log_errors('ERROR calculating Info Ratio')
+    @cached_method
     def info_ratio(self,log_returns = True) -> float:
-        try:
-            if log_returns:
-                outperf_bm = self.log_returns - self.bm_log_returns
-                outperf_mean = np.exp(outperf_bm.mean())-1
-                outperf_std = np.exp(outperf_bm.std())-1
-            
-            else:
-                outperf_bm = self.returns - self.bm_returns
-                outperf_mean = outperf_bm.mean()
-                outperf_std = outperf_bm.std()
-
-            if outperf_std > 0:
-                info_ratio = outperf_mean/outperf_std
-                return info_ratio
-            else:
-                return np.nan
-            
-        except Exception as e:
-            logging.exception(f'ERROR calculating Info Ratio | {e}')
+        self._check_benchmark()
+        if self._paired_returns.size < 2:
+            return np.nan
+        if log_returns:
+            outperf_bm = self._paired_log_returns - self._paired_bm_log_returns
+            outperf_mean = math.expm1(outperf_bm.mean())
+            outperf_std = math.expm1(outperf_bm.std(ddof=1))
+        
+        else:
+            outperf_bm = self._paired_returns - self._paired_bm_returns
+            outperf_mean = outperf_bm.mean()
+            outperf_std = outperf_bm.std(ddof=1)
 
-    def beta_alpha(self,geometric=True):
+        if outperf_std > 0:
+            info_ratio = outperf_mean/outperf_std
+            return info_ratio
+        else:
+            return np.nan
 
-        try:
-            if geometric:
-                linreg = lr(self.bm_log_returns,self.log_returns)
-                beta = linreg[0]
-                alpha = np.exp(linreg[1])-1
-            
-            else:
-                linreg = lr(self.bm_returns,self.returns)
-                beta = linreg[0]
-                alpha = linreg[1]
-            
-            return {'alpha':alpha,'beta':beta}
-            
-        except Exception as e:
-            logging.exception(f'ERROR calculating Info Ratio | {e}')
+    @log_errors('ERROR calculating Beta and Alpha')
+    def beta_alpha(self,geometric=True):
+        self._check_benchmark()
+        if geometric:
+            linreg = self._log_linreg
+            beta = linreg[0]
+            alpha = math.expm1(linreg[1])
+        
+        else:
+            linreg = self._linreg
+            beta = linreg[0]
+            alpha = linreg[1]
+        
+        return {'alpha':alpha,'beta':beta}
 
+    @log_errors('ERROR calculating Jensen Alpha')
+    @cached_method
     def jensen_alpha(self, rf:float, geometric = True) -> float:
-        try:
-            if geometric:
-                beta = self.beta_alpha(geometric=True)['beta']
-                bm_mean_returns = np.exp(np.log(1+self.bm_log_returns).mean())-1
-                mean_returns = self.mean_returns(geometric=True)
-            else:
-                beta = self.beta_alpha(geometric=False)['beta']
-                bm_mean_returns = self.bm_returns.mean()
-                mean_returns = self.mean_returns(geometric=False)
-                
-            bm_excess_return = bm_mean_returns - rf
-            jensen_alpha = mean_returns - (rf + beta*bm_excess_return)
-            return jensen_alpha
-        
-        except Exception as e:
-            logging.exception(f'ERROR calculating Jensen Alpha | {e}')
\ No newline at end of file
+        self._check_benchmark()
+        # Beta is NaN below two paired observations:
+        if self._paired_returns.size < 2:
+            return np.nan
+        if geometric:
+            beta = self.beta_alpha(geometric=True)['beta']
+            bm_mean_returns = math.expm1(self._bm_log_returns.mean())
+            mean_returns = self.mean_returns(geometric=True)
+        else:
+            beta = self.beta_alpha(geometric=False)['beta']
+            bm_mean_returns = self._bm_returns.mean()
+            mean_returns = self.mean_returns(geometric=False)
+            
+        bm_excess_return = bm_mean_returns - rf
+        jensen_alpha = mean_returns - (rf + beta*bm_excess_return)
+        return jensen_alpha
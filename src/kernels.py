@@ -0,0 +1,276 @@
+import numpy as np
+
+def period_returns(balances:np.ndarray,periods:int) -> np.ndarray:
+    """
+    Simple returns over a number of periods along the first axis, as pct_change(periods, fill_method=None).
+
+    Parameters:
+    balances (np.ndarray): Balance values, one column per asset (or a single series).
+    periods (int): Number of steps between the two balances of each return.
+
+    Returns:
+    np.ndarray: Returns with the same shape, memory layout and float type, NaN for the first periods rows.
+    """
+    returns = np.full_like(balances,np.nan,dtype=np.result_type(balances,np.float32))
+    if periods < balances.shape[0]:
+        with np.errstate(divide='ignore',invalid='ignore'):
+            np.divide(balances[periods:],balances[:-periods],out=returns[periods:])
+        returns[periods:] -= 1
+    return returns
+
+def batch_drawdown(balances:np.ndarray) -> tuple:
+    """
+    Running peak and drawdown of every column of a balance array.
+
+    Parameters:
+    balances (np.ndarray): Balance values, one column per asset.
+
+    Returns:
+    tuple: (running_max, drawdown) arrays, the drawdown as a negative percentage of the running peak.
+    """
+    running_max = np.fmax.accumulate(balances,axis=0)
+    drawdown = np.subtract(balances,running_max)
+    drawdown /= running_max
+    return running_max, drawdown
+
+def batch_max_drawdown(balances:np.ndarray,drawdown:tuple=None) -> np.ndarray:
+    """
+    Maximum drawdown of every column of a balance array.
+
+    Parameters:
+    balances (np.ndarray): Balance values, one column per asset.
+    drawdown (tuple, optional): (running_max, drawdown) from batch_drawdown, computed if not given.
+
+    Returns:
+    np.ndarray: The maximum drawdown of each column as a percentage.
+    """
+    if drawdown is None:
+        drawdown = batch_drawdown(balances)
+    return np.nanmin(drawdown[1],axis=0)
+
+def rolling_max_drawdown(balance:np.ndarray,window:int) -> np.ndarray:
+    """
+    Maximum drawdown within every rolling window of a balance array.
+
+    The windows are strided views of the balance, so every window is processed
+    at once by the batch drawdown kernel instead of a Python callback per window.
+
+    Parameters:
+    balance (np.ndarray): Balance values.
+    window (int): Number of balance observations in each window.
+
+    Returns:
+    np.ndarray: Maximum drawdown of the window ending at each step, len(balance) - window + 1 values.
+    """
+    if window > balance.shape[0]:
+        return np.empty(0,dtype=balance.dtype)
+    windows = np.lib.stride_tricks.sliding_window_view(balance,window)
+    return batch_max_drawdown(windows.T)
+
+def batch_losing_streak(returns:np.ndarray) -> np.ndarray:
+    """
+    Longest run of consecutive negative returns in every column of a returns array.
+
+    Parameters:
+    returns (np.ndarray): Returns values, one column per asset. NaN breaks a streak.
+
+    Returns:
+    np.ndarray: Length of the longest losing streak of each column.
+    """
+    if returns.shape[0] == 0:
+        return np.zeros(returns.shape[1],dtype=np.int64)
+
+    # Steps since the last non negative return:
+    steps = np.arange(returns.shape[0])[:,None]
+    last_reset = np.maximum.accumulate(np.where(returns < 0,-1,steps),axis=0)
+    return (steps - last_reset).max(axis=0)
+
+def batch_recovery(balances:np.ndarray,drawdown:tuple=None) -> np.ndarray:
+    """
+    Number of steps needed to recover from the maximum drawdown of every column of a balance array.
+
+    Parameters:
+    balances (np.ndarray): Balance values, one column per asset.
+    drawdown (tuple, optional): (running_max, drawdown) from batch_drawdown, computed if not given.
+
+    Returns:
+    np.ndarray: Recovery period of each column, NaN if there is no drawdown or it never recovers.
+    """
+    if drawdown is None:
+        drawdown = batch_drawdown(balances)
+    running_max, drawdown = drawdown
+    trough = np.nanargmin(drawdown,axis=0)
+    cols = np.arange(balances.shape[1])
+
+    # First step back at the peak prior to the trough:
+    steps = np.arange(balances.shape[0])[:,None]
+    recovered = (balances >= running_max[trough,cols]) & (steps >= trough)
+    recovery = (recovered.argmax(axis=0) - trough).astype(np.float64)
+
+    # No drawdown occurred or never recovers:
+    recovery[(drawdown[trough,cols] >= 0) | ~recovered.any(axis=0)] = np.nan
+    return recovery
+
+def batch_tail_risk(returns:np.ndarray,level=99) -> tuple:
+    """
+    Empirical Value at Risk and Expected Shortfall of every column of a returns array.
+
+    Only the k = ceil(n*(100 - level)/100) worst returns of each column are needed,
+    so they are selected with a single partition and only that tail is sorted.
+
+    Parameters:
+    returns (np.ndarray): Returns values, one column per asset. NaN are ignored.
+    level (float, optional): Confidence level in percent. Defaults to 99.
+
+    Returns:
+    tuple: (var, es) arrays, the k-th worst return and the mean of the k worst returns of each column.
+    """
+    n_cols = returns.shape[1]
+    if returns.shape[0] == 0:
+        return np.full(n_cols,np.nan), np.full(n_cols,np.nan)
+
+    n = (~np.isnan(returns)).sum(axis=0)
+    k = np.maximum(np.ceil(n*(100 - level)/100).astype(np.int64),1)
+    k_max = min(k.max(),returns.shape[0])
+
+    # Worst k_max returns of each column in ascending order (NaN go last):
+    tail = np.sort(np.partition(returns,k_max - 1,axis=0)[:k_max],axis=0)
+    in_tail = np.arange(k_max)[:,None] < k
+
+    var = tail[k - 1,np.arange(n_cols)]
+    es = np.where(in_tail,tail,0).sum(axis=0)/k
+    return var, es
+
+def batch_regression(x:np.ndarray,y:np.ndarray) -> tuple:
+    """
+    Least squares regression of every column of y on x, using pairwise complete observations.
+
+    The paired means of each column are taken first and the cross products are centred on them,
+    so the sums stay accurate when the values are far from zero. Unpaired observations are zeroed out.
+
+    Parameters:
+    x (np.ndarray): Regressor values (e.g. benchmark returns), one value per row of y. Upcast to float64.
+    y (np.ndarray): Regressand values, one column per asset. Upcast to float64.
+
+    Returns:
+    tuple: (slope, intercept, correlation) float64 arrays with one value per column of y, NaN below two pairs.
+    """
+    # Sums of products are accumulated in float64 whatever the input precision:
+    x = np.asarray(x,dtype=np.float64)
+    y = np.asarray(y,dtype=np.float64)
+    valid = ~np.isnan(x)[:,None] & ~np.isnan(y)
+    weights = valid.astype(np.float64)
+    n = weights.sum(axis=0)
+
+    # Columns with less than two pairs are NaN:
+    with np.errstate(divide='ignore',invalid='ignore'):
+        x_mean = np.where(np.isnan(x),0,x)@weights/n
+        y_mean = np.where(valid,y,0).sum(axis=0)/n
+        x_dev = np.where(valid,x[:,None] - x_mean,0)
+        y_dev = np.where(valid,y - y_mean,0)
+        sxy = np.einsum('ij,ij->j',x_dev,y_dev)
+        sxx = np.einsum('ij,ij->j',x_dev,x_dev)
+        syy = np.einsum('ij,ij->j',y_dev,y_dev)
+
+        slope = sxy/sxx
+        intercept = y_mean - slope*x_mean
+        corr = sxy/np.sqrt(sxx*syy)
+    return slope, intercept, corr
+
+def batch_masked_std(values:np.ndarray,mask:np.ndarray) -> np.ndarray:
+    """
+    Sample standard deviation (ddof=1) of every column of an array over the rows selected by a mask.
+
+    Parameters:
+    values (np.ndarray): Values, one column per asset.
+    mask (np.ndarray): Boolean array of the same shape, True for the observations to include.
+
+    Returns:
+    np.ndarray: Standard deviation of each column, NaN below two selected observations.
+    """
+    count = np.count_nonzero(mask,axis=0)
+    with np.errstate(divide='ignore',invalid='ignore'):
+        mean = np.where(mask,values,0).sum(axis=0)/count
+        deviations = np.where(mask,values - mean,0)
+        variance = np.einsum('ij,ij->j',deviations,deviations)/(count - 1)
+    return np.sqrt(np.where(count > 1,variance,np.nan))
+
+def max_drawdown(balance:np.ndarray,drawdown:tuple=None) -> float:
+    """
+    Maximum drawdown of a balance array.
+
+    Parameters:
+    balance (np.ndarray): Balance values.
+    drawdown (tuple, optional): batch_drawdown of balance as a single column, computed if not given.
+
+    Returns:
+    float: The maximum drawdown as a percentage.
+    """
+    return batch_max_drawdown(balance[:,None],drawdown)[0]
+
+def max_losing_streak(returns:np.ndarray) -> int:
+    """
+    Longest run of consecutive negative returns.
+
+    Parameters:
+    returns (np.ndarray): Returns values. NaN breaks a streak.
+
+    Returns:
+    int: Length of the longest losing streak.
+    """
+    return int(batch_losing_streak(returns[:,None])[0])
+
+def max_dd_recovery(balance:np.ndarray,drawdown:tuple=None):
+    """
+    Number of steps needed to recover from the maximum drawdown of a balance array.
+
+    Parameters:
+    balance (np.ndarray): Balance values.
+    drawdown (tuple, optional): batch_drawdown of balance as a single column, computed if not given.
+
+    Returns:
+    int: Recovery period, None if there is no drawdown or it never recovers.
+    """
+    recovery = batch_recovery(balance[:,None],drawdown)[0]
+    return None if np.isnan(recovery) else int(recovery)
+
+def tail_risk(returns:np.ndarray,level=99) -> tuple:
+    """
+    Empirical Value at Risk and Expected Shortfall of a returns array.
+
+    Parameters:
+    returns (np.ndarray): Returns values. NaN are ignored.
+    level (float, optional): Confidence level in percent. Defaults to 99.
+
+    Returns:
+    tuple: (var, es), the k-th worst return and the mean of the k worst returns.
+    """
+    var, es = batch_tail_risk(returns[:,None],level)
+    return var[0], es[0]
+
+def regression(x:np.ndarray,y:np.ndarray) -> tuple:
+    """
+    Least squares regression of y on x, ignoring pairs with NaN.
+
+    Parameters:
+    x (np.ndarray): Regressor values.
+    y (np.ndarray): Regressand values, same length as x.
+
+    Returns:
+    tuple: (slope, intercept, correlation).
+    """
+    slope, intercept, corr = batch_regression(x,y[:,None])
+    return slope[0], intercept[0], corr[0]
+
+def masked_std(values:np.ndarray,mask:np.ndarray) -> float:
+    """
+    Sample standard deviation (ddof=1) of the values selected by a mask.
+
+    Parameters:
+    values (np.ndarray): Values.
+    mask (np.ndarray): Boolean array of the same length, True for the observations to include.
+
+    Returns:
+    float: Standard deviation, NaN below two selected observations.
+    """
+    return batch_masked_std(values[:,None],mask[:,None])[0]
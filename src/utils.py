@@ -1,6 +1,9 @@
 import logging
+import functools
+import collections
+import numpy as np
 import pandas as pd
-from scipy.stats import linregress
+from finstats.src.kernels import regression
 
 # Standarize balance frequency with stats frequency:
 bal_freq_standarizer = {
@@ -22,6 +25,40 @@ rf_standarizer = {
   'W': 52
 }
 
+# Fields of scipy's linregress result kept by lr:
+LinregressResult = collections.namedtuple('LinregressResult',['slope','intercept','rvalue'])
+
+def log_errors(msg:str):
+    """
+    Decorator that logs any exception raised by the decorated function and returns None instead.
+
+    Parameters:
+    msg (str): Message logged before the exception, as '{msg} | {exception}'.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args,**kwargs):
+            try:
+                return func(*args,**kwargs)
+            except Exception as e:
+                logging.exception(f'{msg} | {e}')
+        return wrapper
+    return decorator
+
+def cached_method(func):
+    """
+    Decorator that caches a method result per instance and arguments.
+    Only for objects whose state does not change after __init__.
+    """
+    @functools.wraps(func)
+    def wrapper(self,*args,**kwargs):
+        cache = self.__dict__.setdefault('_method_cache',{})
+        key = (func.__name__,args,tuple(sorted(kwargs.items())))
+        if key not in cache:
+            cache[key] = func(self,*args,**kwargs)
+        return cache[key]
+    return wrapper
+
 def check_data_index(data):
     """
     Ensures that the input data is in datetime format. Converts it to datetime if it is not.
@@ -49,6 +86,13 @@ def format_raw_data(raw_data:pd.DataFrame):
         logging.error('Multiple Strategy Stats | NaN Values found in asset price data')
     return raw_data.ffill().dropna(axis=1)
 
+def check_balance_values(balances:np.ndarray):
+    # Check once at the entry point what would otherwise surface as NaN deep inside the stats:
+    if balances.shape[0] < 2:
+        logging.error('Balance Stats | Less than two balance observations')
+    elif (balances <= 0).any():
+        logging.error('Balance Stats | Non positive balance values, log returns will be NaN')
+
 def get_data_frequency(df: pd.Series):
     """
     Check if the DataFrame's index has a frequency set. 
@@ -64,49 +108,45 @@ def get_data_frequency(df: pd.Series):
         return freq.freqstr
     
 def check_bal_freq(balance,bm_balance):
-    # Check balance frequency:
-    bal_freqs = []
-    for bal in [balance,bm_balance]:
-        balance_freq = get_data_frequency(bal)
-        bal_freqs.append(balance_freq)
-    bal_freq_check = all(value == bal_freqs[0] for value in bal_freqs)
-    if not bal_freq_check:
+    # Check balance frequency (against the benchmark if given):
+    balance_freq = get_data_frequency(balance)
+    if bm_balance is not None and get_data_frequency(bm_balance) != balance_freq:
         raise ValueError('Balance and Benchmark balance have a different balance frequency')
-    else:
-        return balance_freq
+    return balance_freq
 
 def get_stats_freq(balance,bm_balance,freq):
     balance_freq = check_bal_freq(balance=balance,bm_balance=bm_balance)
-    try:
-        stats_freq = bal_freq_standarizer[balance_freq][freq]
-        return stats_freq
-    except Exception as e:
-        logging.exception(f'Stats frequency ERROR | {e}')
+    stats_periods = bal_freq_standarizer.get(balance_freq,{})
+    if freq not in stats_periods:
+        raise ValueError(f"Stats frequency '{freq}' is not supported for balance frequency '{balance_freq}'")
+    return stats_periods[freq]
 
 def get_rf(rf,stats_freq):
-    
-    try:
-        standarized_rf = rf/rf_standarizer[stats_freq]
+    # Plain lookup in the live table, an unknown stats frequency raises KeyError (logged by sbs.get_stats):
+    return rf/rf_standarizer[stats_freq]
 
-        return standarized_rf
-    
-    except Exception as e:
-        logging.exception(f'ERROR Standarizing Rf | {e}')
+def lr(x,y):
+    '''
+    Least squares slope, intercept and correlation of y on x, ignoring pairs with NaN.
+    Series are aligned on their common index, arrays must have the same length.
 
-def lr(x:pd.Series,y:pd.Series):
-    '''linear regression model using pandas dataframes as input'''
-    df = pd.concat([x,y],axis=1).dropna()
-    return linregress(df.iloc[:,0],df.iloc[:,1])
+    Returns:
+    LinregressResult: (slope, intercept, rvalue) named tuple, from the same kernel as the batched mbs stats.
+    '''
+    if isinstance(x,pd.Series) and isinstance(y,pd.Series):
+        x, y = x.align(y,join='inner')
+    return LinregressResult(*regression(np.asarray(x,dtype=np.float64),np.asarray(y,dtype=np.float64)))
 
 def remove_outliers(data:pd.DataFrame, threshold=1.5):
-    # Calculate IQR
-    Q1 = data.quantile(0.25)
-    Q3 = data.quantile(0.75)
+    # Calculate IQR (both quartiles from a single quantile call)
+    Q1, Q3 = data.quantile([0.25, 0.75]).to_numpy()
     IQR = Q3 - Q1
     
     # Define bounds for outliers
     lower_bound = Q1 - threshold * IQR
     upper_bound = Q3 + threshold * IQR
     
-    # Filter out the outliers
-    return data[(data > lower_bound) & (data < upper_bound)]
\ No newline at end of file
+    # Mask out the outliers
+    values = data.to_numpy()
+    inliers = (values > lower_bound) & (values < upper_bound)
+    return data.where(inliers) if isinstance(data, pd.DataFrame) else data[inliers]
\ No newline at end of file
@@ -0,0 +1,13 @@
+import importlib.util
+import pathlib
+import sys
+
+# The repository root is the finstats package itself, register it under its import name:
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+
+if 'finstats' not in sys.modules:
+    spec = importlib.util.spec_from_file_location('finstats', ROOT / '__init__.py',
+                                                  submodule_search_locations=[str(ROOT)])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['finstats'] = module
+    spec.loader.exec_module(module)
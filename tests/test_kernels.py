@@ -0,0 +1,259 @@
+import math
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import finstats
+from finstats.src import kernels
+from finstats.src.core import fin_stats
+
+
+def random_balances(n_rows=300, n_cols=4, seed=0):
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0005, 0.02, size=(n_rows, n_cols))
+    return 100 * np.cumprod(1 + returns, axis=0)
+
+
+# Loop definitions the kernels replace:
+
+def loop_max_drawdown(balance):
+    peak, max_dd = balance[0], 0.0
+    for x in balance:
+        peak = max(peak, x)
+        max_dd = min(max_dd, (x - peak) / peak)
+    return max_dd
+
+def loop_losing_streak(returns):
+    current_streak, max_streak = 0, 0
+    for x in returns:
+        if x < 0:
+            current_streak += 1
+            max_streak = max(max_streak, current_streak)
+        else:
+            current_streak = 0
+    return max_streak
+
+def loop_recovery(balance):
+    peak, trough_peak, max_dd, trough = balance[0], balance[0], 0.0, 0
+    for index, x in enumerate(balance):
+        peak = max(peak, x)
+        if (peak - x) / peak > max_dd:
+            max_dd, trough, trough_peak = (peak - x) / peak, index, peak
+    if max_dd == 0:
+        return None
+    for index in range(trough, len(balance)):
+        if balance[index] >= trough_peak:
+            return index - trough
+    return None
+
+def loop_tail_risk(returns, level=99):
+    worst = sorted(x for x in returns if not math.isnan(x))
+    k = max(math.ceil(len(worst) * (100 - level) / 100), 1)
+    return worst[k - 1], sum(worst[:k]) / k
+
+
+@pytest.mark.parametrize('periods', [1, 5, 21])
+def test_period_returns_matches_pct_change(periods):
+    balances = random_balances()
+    expected = pd.DataFrame(balances).pct_change(periods, fill_method=None).to_numpy()
+    np.testing.assert_allclose(kernels.period_returns(balances, periods), expected, rtol=1e-12)
+
+def test_max_drawdown_matches_loop():
+    balances = random_balances()
+    expected = [loop_max_drawdown(balances[:, col]) for col in range(balances.shape[1])]
+    np.testing.assert_allclose(kernels.batch_max_drawdown(balances), expected, rtol=1e-12)
+    assert kernels.max_drawdown(balances[:, 0]) == pytest.approx(expected[0], rel=1e-12)
+
+def test_rolling_max_drawdown_matches_loop():
+    balance = random_balances(n_cols=1)[:, 0]
+    window = 20
+    expected = [loop_max_drawdown(balance[end - window:end]) for end in range(window, len(balance) + 1)]
+    np.testing.assert_allclose(kernels.rolling_max_drawdown(balance, window), expected, rtol=1e-12)
+    assert kernels.rolling_max_drawdown(balance, len(balance) + 1).size == 0
+
+def test_losing_streak_matches_loop():
+    returns = kernels.period_returns(random_balances(), 1)
+    expected = [loop_losing_streak(returns[:, col]) for col in range(returns.shape[1])]
+    np.testing.assert_array_equal(kernels.batch_losing_streak(returns), expected)
+    assert kernels.max_losing_streak(returns[:, 0]) == expected[0]
+
+def test_recovery_matches_loop():
+    # A V shaped series recovers, a falling one never does and a rising one has no drawdown:
+    balances = np.column_stack([np.r_[100, 90, 80, 95, 101, 99],
+                                np.r_[100, 99, 98, 97, 96, 95],
+                                np.r_[100, 101, 102, 103, 104, 105],
+                                random_balances(n_rows=6, n_cols=1, seed=3)[:, 0]]).astype(np.float64)
+    for col in range(balances.shape[1]):
+        assert kernels.max_dd_recovery(balances[:, col]) == loop_recovery(balances[:, col])
+
+@pytest.mark.parametrize('level', [95, 99])
+def test_tail_risk_matches_loop(level):
+    returns = kernels.period_returns(random_balances(), 1)
+    for col in range(returns.shape[1]):
+        var, es = kernels.tail_risk(returns[:, col], level)
+        expected_var, expected_es = loop_tail_risk(returns[:, col], level)
+        assert var == pytest.approx(expected_var, rel=1e-12)
+        assert es == pytest.approx(expected_es, rel=1e-12)
+
+def test_tail_risk_large_n_beats_sorting():
+    returns = np.random.default_rng(6).normal(size=1_000_000)
+    returns[::1000] = np.nan
+
+    start = time.perf_counter()
+    worst = np.sort(returns)
+    sort_time = time.perf_counter() - start
+    start = time.perf_counter()
+    var, es = kernels.tail_risk(returns)
+    tail_time = time.perf_counter() - start
+
+    k = math.ceil(np.count_nonzero(~np.isnan(returns)) / 100)
+    assert var == worst[k - 1]
+    assert es == pytest.approx(worst[:k].mean(), rel=1e-12)
+    # A partition per kth value is O(n*k), thousands of times slower than a full sort here:
+    assert tail_time < 10 * sort_time + 0.05
+
+@pytest.mark.parametrize('level', [0, 1e6])
+def test_regression_matches_centered_least_squares(level):
+    rng = np.random.default_rng(1)
+    x = level + rng.normal(size=200)
+    y = 0.7 * x + rng.normal(scale=0.5, size=200)
+    x[10] = np.nan
+    valid = ~np.isnan(x)
+    x_dev, y_dev = x[valid] - x[valid].mean(), y[valid] - y[valid].mean()
+    slope = x_dev @ y_dev / (x_dev @ x_dev)
+    expected = (slope, y[valid].mean() - slope * x[valid].mean(), np.corrcoef(x[valid], y[valid])[0, 1])
+    np.testing.assert_allclose(kernels.regression(x, y), expected, rtol=1e-10)
+    result = finstats.lr(x, y)
+    np.testing.assert_allclose(result, expected, rtol=1e-10)
+    assert (result.slope, result.intercept, result.rvalue) == tuple(result)
+
+def test_masked_std_matches_numpy():
+    values = np.random.default_rng(2).normal(size=100)
+    mask = values < 0.3
+    assert kernels.masked_std(values, mask) == pytest.approx(values[mask].std(ddof=1), rel=1e-12)
+    assert np.isnan(kernels.masked_std(values, values > 10))
+
+
+@pytest.fixture
+def price_data():
+    index = pd.bdate_range('2018-01-01', '2020-12-31')
+    balances = random_balances(n_rows=len(index), n_cols=3, seed=4)
+    prices = pd.DataFrame(balances, index=index, columns=['a1', 'a2', 'a3'])
+    bm = pd.Series(random_balances(n_rows=len(index), n_cols=1, seed=5)[:, 0], index=index, name='bm')
+    return prices, bm
+
+@pytest.mark.parametrize('freq', ['D', 'M', 'Y'])
+def test_sbs_matches_mbs(price_data, freq):
+    prices, bm = price_data
+    start, end = prices.index[0], prices.index[-1]
+    batch = finstats.mbs(prices, bm, start, end).stats_df(freq)
+    for asset in prices.columns:
+        single = finstats.sbs(prices[asset], bm, start, end).df(freq)
+        for metric, value in single.items():
+            if isinstance(value, float):
+                assert batch.loc[metric, asset] == pytest.approx(value, rel=1e-9, nan_ok=True), metric
+            else:
+                assert batch.loc[metric, asset] == value, metric
+
+def test_short_window_is_nan_without_warnings(price_data):
+    # Fewer balances than a monthly period, so there is no valid return:
+    prices, bm = price_data
+    prices, bm = prices.iloc[:15], bm.iloc[:15]
+    start, end = prices.index[0], prices.index[-1]
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        single = finstats.sbs(prices['a1'], bm, start, end).df('M')
+        batch = finstats.mbs(prices, bm, start, end).stats_df('M')
+
+    for metric in ['Geometric Mean Return', 'Standard Deviation', 'Downside Standard Deviation',
+                   'Sharpe Ratio', 'VAR 99', 'Positive %', 'Beta', 'Alpha', 'Correlation',
+                   'Information Ratio', 'Jensen Alpha']:
+        assert np.isnan(single[metric]), metric
+        assert np.isnan(batch.loc[metric, 'a1']), metric
+    assert single['Max Losing Streak'] == 0
+
+def test_unsupported_stats_frequency_raises(price_data):
+    prices, bm = price_data
+    with pytest.raises(ValueError, match="'W'.*'B'"):
+        finstats.mbs(prices, bm, prices.index[0], prices.index[-1]).stats_df('W')
+
+def test_fin_stats_without_benchmark(price_data):
+    prices, _ = price_data
+    stats = fin_stats(prices['a1'], 'M')
+    assert stats.returns_standard_deviation() > 0
+    with pytest.raises(ValueError, match='bm_balance'):
+        stats.correlation()
+
+
+# Documented behaviour of the single series and report functions:
+
+@pytest.mark.parametrize('freq, periods', [('D', 1), ('M', 21)])
+def test_returns_standard_deviation_matches_log_returns_std(price_data, freq, periods):
+    prices, bm = price_data
+    stats = fin_stats(prices['a1'], freq, bm)
+    log_returns = np.log1p(prices['a1'].pct_change(periods, fill_method=None))
+    assert stats.returns_standard_deviation() == pytest.approx(np.expm1(log_returns.std()), rel=1e-12)
+
+def test_fin_stats_float32(price_data):
+    prices, bm = price_data
+    single = fin_stats(prices['a1'], 'M', bm, dtype=np.float32)
+    double = fin_stats(prices['a1'], 'M', bm)
+    assert single._returns.dtype == np.float32
+    for metric in ['mean_returns', 'returns_standard_deviation', 'downside_deviation', 'max_dd', 'correlation']:
+        assert getattr(single, metric)() == pytest.approx(getattr(double, metric)(), rel=1e-4), metric
+    assert single.beta_alpha()['beta'] == pytest.approx(double.beta_alpha()['beta'], rel=1e-4)
+
+def test_check_bal_freq_without_benchmark(price_data):
+    prices, bm = price_data
+    assert finstats.check_bal_freq(prices['a1'], None) == 'B'
+    with pytest.raises(ValueError):
+        finstats.check_bal_freq(prices['a1'], bm.resample('W').last())
+
+def test_returns_by_month_scatter(price_data):
+    # Partial first and last years, and March 2019 missing:
+    prices, bm = price_data
+    balance = prices['a1'].loc['2018-04-01':'2020-06-30']
+    balance = balance[~((balance.index.year == 2019) & (balance.index.month == 3))]
+    strategy = finstats.sbs(balance, bm, balance.index[0], balance.index[-1])
+    strategy.balance = balance
+    table = strategy.returns_by_month()
+
+    monthly = balance.resample('ME').last().pct_change(fill_method=None)
+    for date, value in monthly.items():
+        cell = table.loc[date.year, finstats._MONTH_NAMES[date.month - 1]]
+        assert cell == pytest.approx(round(value, 6), nan_ok=True), date
+    assert np.isnan(table.loc[2019, 'March']) and np.isnan(table.loc[2019, 'April'])
+    assert np.isnan(table.loc[2018, 'January']) and np.isnan(table.loc[2020, 'December'])
+    yearly = monthly.loc['2020'].add(1).prod() - 1
+    assert table.loc[2020, 'Yearly Returns'] == pytest.approx(round(yearly, 6))
+
+def test_seasonality_count_and_stats(price_data):
+    prices, _ = price_data
+    result = finstats.seasonality(prices['a1'])
+    log_returns = np.log1p(prices['a1'].resample('ME').last().pct_change())
+    january = log_returns[log_returns.index.month == 1].dropna()
+    # count is the number of returns, not expm1 of it:
+    assert result.loc['January', 'count'] == len(january)
+    assert result.loc['January', 'mean'] == pytest.approx(np.expm1(january.mean()), rel=1e-12)
+    assert result.loc['January', '50%'] == pytest.approx(np.expm1(january.median()), rel=1e-12)
+
+def test_indexed_returns_daily(price_data):
+    # Calendar daily resampling of business day prices, weekends are dropped:
+    prices, bm = price_data
+    indexed = finstats.mbs(prices, bm, prices.index[0], prices.index[-1]).indexed_returns(freq='D')
+    expected = (100*prices/prices.iloc[0]).round(3)
+    assert indexed.index[0] == prices.index[0]
+    np.testing.assert_allclose(indexed.to_numpy(), expected.to_numpy(), rtol=1e-12)
+
+def test_asset_perf_contribution_first_valid_price():
+    index = pd.bdate_range('2020-01-01', periods=10)
+    prices = pd.DataFrame({'a': np.linspace(100, 110, 10),
+                           'b': [np.nan]*3 + list(np.linspace(50, 53, 7))}, index=index)
+    portfolio = pd.Series({'a': 0.5, 'b': 0.5})
+    contribution = finstats.asset_perf_contribution(index[0], index[-1], prices, portfolio)
+    assert contribution['a'] == pytest.approx(0.5*(110/100 - 1))
+    # b is listed mid-window and compounds from its first price:
+    assert contribution['b'] == pytest.approx(0.5*(53/50 - 1))